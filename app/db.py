@@ -1,10 +1,85 @@
-from sqlmodel import SQLModel, create_engine
+from typing import Callable, Iterator, Sequence, TypeVar
+
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import Session, SQLModel, create_engine
 
 
 DATABASE_URL = "sqlite:///./nqcc.db"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
 
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _connection_record) -> None:
+    # WAL lets reads proceed during writes; NORMAL sync skips the fsync per commit
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA cache_size=-64000")
+    cur.close()
+
+
+SessionLocal = sessionmaker(bind=engine, class_=Session, expire_on_commit=False)
+
+
+def get_session() -> Iterator[Session]:
+    """FastAPI dependency yielding one session for the lifetime of a request."""
+    with SessionLocal() as session:
+        yield session
+
+
+T = TypeVar("T")
+
+
+# Helpers for async routes, which call them via asyncio.to_thread. Each ends its
+# transaction so the pooled connection isn't held while the route awaits network I/O.
+def load_and_release(session: Session, load: Callable[[Session], T]) -> T:
+    result = load(session)
+    session.commit()
+    return result
+
+
+def save_all(session: Session, rows: Sequence[SQLModel]) -> None:
+    """Insert `rows` in one transaction, so a batch costs a single commit."""
+    session.add_all(rows)
+    session.commit()
+
+
+def _add_missing_columns() -> None:
+    # create_all never alters existing tables, so add columns declared since
+    ddl_compiler = engine.dialect.ddl_compiler(engine.dialect, None)
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = (
+                f"ALTER TABLE {ddl_compiler.preparer.format_table(table)} "
+                f"ADD COLUMN {ddl_compiler.preparer.format_column(column)} "
+                f"{ddl_compiler.dialect.type_compiler_instance.process(column.type)}"
+            )
+            default = ddl_compiler.get_column_default_string(column)
+            if default is not None:
+                ddl += f" DEFAULT {default}"
+            try:
+                with engine.begin() as conn:
+                    conn.exec_driver_sql(ddl)
+            except OperationalError as exc:
+                # Another worker starting at the same time may have added it first
+                if "duplicate column name" not in str(exc.orig):
+                    raise
+
+
 def init_db() -> None:
+    _add_missing_columns()
     SQLModel.metadata.create_all(engine)
-
+    # create_all skips tables that already exist, so add any indexes declared
+    # after the database was first created
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
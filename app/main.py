@@ -1,13 +1,45 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
+from . import settings
 from .db import init_db
 from .routers import apis, websites, robot
+from .services.allure_reports import create_report_queue, run_report_worker
+from .services.http_check import create_client, create_probe_cache
+from .services.run_status import create_run_status_store
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for every probe so keepalive connections are reused
+    app.state.http = create_client()
+    app.state.probe_cache = create_probe_cache()
+    app.state.run_status = create_run_status_store(settings.REDIS_URL, settings.RUN_STATUS_TTL_S)
+    app.state.report_queue = create_report_queue()
+    report_worker = asyncio.create_task(run_report_worker(app.state.report_queue, app.state.run_status))
+    try:
+        yield
+    finally:
+        report_worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await report_worker
+        await app.state.http.aclose()
+        await app.state.run_status.close()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="Nouveau QA Control Center (NQCC)", version="0.1.0")
+    app = FastAPI(
+        title="Nouveau QA Control Center (NQCC)",
+        version="0.1.0",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
+    )
 
     app.add_middleware(
         CORSMiddleware,
@@ -23,8 +55,9 @@ def create_app() -> FastAPI:
     app.include_router(websites.router, prefix="/websites", tags=["websites"])
     app.include_router(robot.router, prefix="/robot", tags=["robot"])
 
-    # Serve artifacts: /files/robot_runs/<id>/...
-    app.mount("/files", StaticFiles(directory="./data", html=True), name="files")
+    # Serve artifacts: /files/robot_runs/<id>/... (nginx takes over in production, see nginx.conf)
+    if settings.SERVE_FILES:
+        app.mount("/files", StaticFiles(directory="./data", html=True), name="files")
 
     @app.get("/healthz")
     def health() -> dict:
@@ -1,10 +1,19 @@
+import json
 from datetime import datetime, timezone
-from typing import Optional
-
+from functools import lru_cache
+from typing import Any, Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
+@lru_cache(maxsize=1024)
+def _parse_json(raw: str) -> Any:
+    # Keyed on the raw string, so an edited endpoint simply misses the cache.
+    # Callers must treat the result as read-only since it is shared.
+    return json.loads(raw)
+
+
 class ApiEndpoint(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
@@ -14,6 +23,14 @@ class ApiEndpoint(SQLModel, table=True):
     body_json: Optional[str] = Field(default=None, description="JSON string of body")
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+    @property
+    def headers(self) -> Optional[dict]:
+        return _parse_json(self.headers_json) if self.headers_json else None
+
+    @property
+    def body(self) -> Any:
+        return _parse_json(self.body_json) if self.body_json else None
+
 
 class WebsiteCheck(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -22,6 +39,8 @@ class WebsiteCheck(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ApiRun(SQLModel, table=True):
+    __table_args__ = (Index("ix_apirun_endpoint_id_id", "endpoint_id", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     endpoint_id: int = Field(foreign_key="apiendpoint.id")
     status_code: Optional[int] = None
@@ -31,6 +50,8 @@ class ApiRun(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class WebsiteRun(SQLModel, table=True):
+    __table_args__ = (Index("ix_websiterun_website_id_id", "website_id", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     website_id: int = Field(foreign_key="websitecheck.id")
     ok: bool = False
@@ -46,6 +67,8 @@ class RobotRun(SQLModel, table=True):
     output_dir: str
     return_code: Optional[int] = None
     ok: bool = False
+    # Set once the queued Allure report has been generated
+    report_ready: bool = Field(default=False, sa_column_kwargs={"server_default": "0"})
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
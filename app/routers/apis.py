@@ -1,49 +1,71 @@
-from typing import List
+import asyncio
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException
+import httpx
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 
-from ..db import engine
+from ..db import get_session, load_and_release, save_all
 from ..models import ApiEndpoint, ApiRun
-from ..services.http_check import perform_http_request
+from ..services.http_check import (
+    failed_result,
+    gather_probes,
+    get_http_client,
+    get_probe_cache,
+    perform_http_request,
+)
 
 
 router = APIRouter()
 
 
+async def _probe_endpoint(
+    client: httpx.AsyncClient,
+    endpoint: ApiEndpoint,
+    cache: Optional[TTLCache] = None,
+) -> dict:
+    # Parse stored JSON here so a malformed endpoint fails only its own probe
+    try:
+        headers, body = endpoint.headers, endpoint.body
+    except ValueError as exc:
+        return failed_result(f"invalid endpoint JSON: {exc}")
+    return await perform_http_request(client, endpoint.method, endpoint.url, headers, body, cache=cache)
+
+
 @router.get("/endpoints", response_model=List[ApiEndpoint])
-def list_endpoints() -> List[ApiEndpoint]:
-    with Session(engine) as session:
-        return session.exec(select(ApiEndpoint).order_by(ApiEndpoint.id.desc())).all()
+def list_endpoints(session: Session = Depends(get_session)) -> List[ApiEndpoint]:
+    return session.exec(select(ApiEndpoint).order_by(ApiEndpoint.id.desc())).all()
 
 
 @router.post("/endpoints", response_model=ApiEndpoint)
-def create_endpoint(endpoint: ApiEndpoint) -> ApiEndpoint:
-    with Session(engine) as session:
-        session.add(endpoint)
-        session.commit()
-        session.refresh(endpoint)
-        return endpoint
+def create_endpoint(endpoint: ApiEndpoint, session: Session = Depends(get_session)) -> ApiEndpoint:
+    session.add(endpoint)
+    session.commit()
+    session.refresh(endpoint)
+    return endpoint
 
 
 @router.delete("/endpoints/{endpoint_id}")
-def delete_endpoint(endpoint_id: int) -> dict:
-    with Session(engine) as session:
-        endpoint = session.get(ApiEndpoint, endpoint_id)
-        if not endpoint:
-            raise HTTPException(status_code=404, detail="Endpoint not found")
-        session.delete(endpoint)
-        session.commit()
-        return {"deleted": True}
+def delete_endpoint(endpoint_id: int, session: Session = Depends(get_session)) -> dict:
+    endpoint = session.get(ApiEndpoint, endpoint_id)
+    if not endpoint:
+        raise HTTPException(status_code=404, detail="Endpoint not found")
+    session.delete(endpoint)
+    session.commit()
+    return {"deleted": True}
 
 
 @router.post("/run/{endpoint_id}")
-async def run_single_endpoint(endpoint_id: int) -> dict:
-    with Session(engine) as session:
-        endpoint = session.get(ApiEndpoint, endpoint_id)
-        if not endpoint:
-            raise HTTPException(status_code=404, detail="Endpoint not found")
-    result = await perform_http_request(endpoint.method, endpoint.url, endpoint.headers_json, endpoint.body_json)
+async def run_single_endpoint(
+    endpoint_id: int,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    session: Session = Depends(get_session),
+) -> dict:
+    endpoint = await asyncio.to_thread(load_and_release, session, lambda s: s.get(ApiEndpoint, endpoint_id))
+    if not endpoint:
+        raise HTTPException(status_code=404, detail="Endpoint not found")
+    result = await _probe_endpoint(client, endpoint)
     run = ApiRun(
         endpoint_id=endpoint_id,
         status_code=result.get("status_code"),
@@ -51,29 +73,28 @@ async def run_single_endpoint(endpoint_id: int) -> dict:
         latency_ms=result.get("latency_ms"),
         error=result.get("error"),
     )
-    with Session(engine) as session:
-        session.add(run)
-        session.commit()
+    await asyncio.to_thread(save_all, session, [run])
     return result
 
 
 @router.post("/run-all")
-async def run_all_endpoints() -> List[dict]:
-    with Session(engine) as session:
-        endpoints = session.exec(select(ApiEndpoint)).all()
-    results: List[dict] = []
-    for ep in endpoints:
-        result = await perform_http_request(ep.method, ep.url, ep.headers_json, ep.body_json)
-        run = ApiRun(
+async def run_all_endpoints(
+    client: httpx.AsyncClient = Depends(get_http_client),
+    cache: Optional[TTLCache] = Depends(get_probe_cache),
+    session: Session = Depends(get_session),
+) -> List[dict]:
+    endpoints = await asyncio.to_thread(load_and_release, session, lambda s: s.exec(select(ApiEndpoint)).all())
+    probe_results = await gather_probes(_probe_endpoint(client, ep, cache) for ep in endpoints)
+    runs = [
+        ApiRun(
             endpoint_id=ep.id,  # type: ignore[arg-type]
             status_code=result.get("status_code"),
             ok=bool(result.get("ok")),
             latency_ms=result.get("latency_ms"),
             error=result.get("error"),
         )
-        with Session(engine) as session:
-            session.add(run)
-            session.commit()
-        results.append({"id": ep.id, "name": ep.name, **result})
-    return results
+        for ep, result in zip(endpoints, probe_results)
+    ]
+    await asyncio.to_thread(save_all, session, runs)
+    return [{"id": ep.id, "name": ep.name, **result} for ep, result in zip(endpoints, probe_results)]
 
@@ -1,21 +1,78 @@
+import asyncio
 import os
 import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import orjson
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlmodel import Session
+from sqlalchemy import update
+from sqlmodel import Session, select
 
-from ..db import engine
+from ..db import SessionLocal, get_session, save_all
 from ..models import RobotRun, RobotPreset
+from ..services.allure_reports import get_report_queue
 from ..services.robot_runner import run_robot_suite
+from ..services.run_status import get_run_status_store
 
 
 router = APIRouter()
 
-# Store running tasks status
-running_tasks = {}
+# Strong references to in-flight suite tasks so they aren't garbage collected
+_suite_tasks: Set[asyncio.Task] = set()
+
+# Suite paths recently confirmed to exist; misses are never cached so new suites show up at once
+_existing_suites: TTLCache = TTLCache(maxsize=256, ttl=10)
+
+
+@lru_cache(maxsize=256)
+def _normalize_path(path: str) -> str:
+    return os.path.abspath(os.path.expanduser(path.strip()))
+
+
+async def _suite_exists(path: str) -> bool:
+    if path in _existing_suites:
+        return True
+    exists = await asyncio.to_thread(os.path.exists, path)
+    if exists:
+        _existing_suites[path] = True
+    return exists
+
+
+def _create_run(session: Session, suite_path: str) -> RobotRun:
+    run = RobotRun(suite_path=suite_path, output_dir="", return_code=None, ok=False)
+    session.add(run)
+    session.commit()  # assigns run.id; no refresh needed since commits don't expire
+    return run
+
+
+def _finish_run(run_id: int, out_dir: str, rc: int) -> None:
+    with SessionLocal() as session:
+        session.execute(
+            update(RobotRun)
+            .where(RobotRun.id == run_id)
+            .values(output_dir=out_dir, return_code=rc, ok=rc == 0)
+        )
+        session.commit()
+
+
+def _start_suite(
+    status_store,
+    report_queue: asyncio.Queue,
+    run_id: int,
+    suite_path: str,
+    variables: Optional[dict],
+    extra_args: Optional[list],
+) -> None:
+    task = asyncio.create_task(
+        execute_robot_suite(status_store, report_queue, run_id, suite_path, variables, extra_args)
+    )
+    _suite_tasks.add(task)
+    task.add_done_callback(_suite_tasks.discard)
+
 
 class RobotRunRequest(BaseModel):
     suite_path: str
@@ -25,36 +82,31 @@ class RobotRunRequest(BaseModel):
 
 
 @router.post("/run")
-async def trigger_robot_run(body: RobotRunRequest, background_tasks: BackgroundTasks) -> dict:
-    normalized_path = os.path.abspath(os.path.expanduser(body.suite_path.strip()))
-    if not os.path.exists(normalized_path):
+async def trigger_robot_run(
+    body: RobotRunRequest,
+    session: Session = Depends(get_session),
+    status_store=Depends(get_run_status_store),
+    report_queue: asyncio.Queue = Depends(get_report_queue),
+) -> dict:
+    normalized_path = _normalize_path(body.suite_path)
+    if not await _suite_exists(normalized_path):
         raise HTTPException(
             status_code=400,
             detail=f"suite_path does not exist on server: {normalized_path}",
         )
 
     # Pre-create run to get sequential ID and folder per run
-    with Session(engine) as session:
-        run = RobotRun(suite_path=normalized_path, output_dir="", return_code=None, ok=False)
-        session.add(run)
-        session.commit()
-        session.refresh(run)
+    run = await asyncio.to_thread(_create_run, session, normalized_path)
 
     # Store initial running status
-    running_tasks[run.id] = {
+    await status_store.set(run.id, {
         "status": "running",
         "start_time": datetime.now().isoformat(),
         "suite_path": normalized_path
-    }
+    })
 
     # Run in background
-    background_tasks.add_task(
-        execute_robot_suite,
-        run.id,
-        normalized_path,
-        body.variables,
-        body.extra_args
-    )
+    _start_suite(status_store, report_queue, run.id, normalized_path, body.variables, body.extra_args)
 
     return {
         "run_id": run.id,
@@ -64,16 +116,22 @@ async def trigger_robot_run(body: RobotRunRequest, background_tasks: BackgroundT
     }
 
 
-def execute_robot_suite(run_id: int, suite_path: str, variables: dict, extra_args: list):
+async def execute_robot_suite(
+    status_store,
+    report_queue: asyncio.Queue,
+    run_id: int,
+    suite_path: str,
+    variables: dict,
+    extra_args: list,
+):
     """Execute robot framework suite in background and update status"""
     try:
         out_dir = os.path.abspath(os.path.join("./data/robot_runs", str(run_id)))
         
         # Update status to show execution started
-        running_tasks[run_id]["status"] = "executing"
-        running_tasks[run_id]["message"] = "Running test cases..."
+        await status_store.update(run_id, status="executing", message="Running test cases...")
         
-        rc = run_robot_suite(
+        rc = await run_robot_suite(
             suite_path,
             out_dir,
             variables=variables,
@@ -81,72 +139,86 @@ def execute_robot_suite(run_id: int, suite_path: str, variables: dict, extra_arg
         )
 
         # Update the run in database
-        with Session(engine) as session:
-            run = session.get(RobotRun, run_id)
-            run.output_dir = out_dir
-            run.return_code = rc
-            run.ok = rc == 0
-            session.add(run)
-            session.commit()
+        await asyncio.to_thread(_finish_run, run_id, out_dir, rc)
 
         # Update running tasks with completion
-        running_tasks[run_id] = {
+        await status_store.set(run_id, {
             "status": "completed",
             "return_code": rc,
             "ok": rc == 0,
             "suite_path": suite_path,
             "output_dir": out_dir,
+            "report_ready": False,
             "completion_time": datetime.now().isoformat()
-        }
+        })
+        # Queue only after the completed entry is written, so the worker's
+        # report_ready update can't be overwritten by it
+        report_queue.put_nowait((run_id, out_dir))
 
     except Exception as e:
         # Update running tasks with error
-        running_tasks[run_id] = {
+        await status_store.set(run_id, {
             "status": "error",
             "error": str(e),
             "suite_path": suite_path
-        }
+        })
 
 
 @router.get("/run-status/{run_id}")
-def get_run_status(run_id: int) -> dict:
+async def get_run_status(
+    run_id: int,
+    session: Session = Depends(get_session),
+    status_store=Depends(get_run_status_store),
+) -> dict:
     """Get current status of a running test"""
     # Check if run is in running tasks
-    if run_id in running_tasks:
-        return running_tasks[run_id]
+    status = await status_store.get(run_id)
+    if status is not None:
+        return status
     
     # Check if run exists in database (completed)
-    with Session(engine) as session:
-        run = session.get(RobotRun, run_id)
-        if run:
-            return {
-                "status": "completed",
-                "return_code": run.return_code,
-                "ok": run.ok,
-                "suite_path": run.suite_path,
-                "output_dir": run.output_dir,
-                "created_at": run.created_at.isoformat()
-            }
+    run = await asyncio.to_thread(session.get, RobotRun, run_id)
+    if run:
+        return {
+            "status": "completed",
+            "return_code": run.return_code,
+            "ok": run.ok,
+            "suite_path": run.suite_path,
+            "output_dir": run.output_dir,
+            "report_ready": run.report_ready,
+            "created_at": run.created_at.isoformat()
+        }
     
     raise HTTPException(status_code=404, detail="Run not found")
 
 
 @router.get("/runs")
-def list_runs() -> list[dict]:
-    runs: list[RobotRun]
-    with Session(engine) as session:
-        runs = session.query(RobotRun).order_by(RobotRun.id.desc()).limit(100).all()
+def list_runs(session: Session = Depends(get_session)) -> list[dict]:
+    # Fetch only the columns the listing needs, as plain rows rather than ORM instances
+    rows = session.exec(
+        select(
+            RobotRun.id,
+            RobotRun.ok,
+            RobotRun.return_code,
+            RobotRun.suite_path,
+            RobotRun.created_at,
+            RobotRun.report_ready,
+        )
+        .order_by(RobotRun.id.desc())
+        .limit(100)
+    ).all()
     out: list[dict] = []
-    for r in runs:
+    for run_id, ok, return_code, suite_path, created_at, report_ready in rows:
         out.append({
-            "id": r.id,
-            "ok": r.ok,
-            "return_code": r.return_code,
-            "suite_path": r.suite_path,
-            "created_at": r.created_at.isoformat(),
-            "allure_index": f"/files/robot_runs/{r.id}/allure-report/index.html",
-            "log_html": f"/files/robot_runs/{r.id}/log.html",
-            "report_html": f"/files/robot_runs/{r.id}/report.html",
+            "id": run_id,
+            "ok": ok,
+            "return_code": return_code,
+            "suite_path": suite_path,
+            "created_at": created_at.isoformat(),
+            "report_ready": report_ready,
+            "allure_index": f"/files/robot_runs/{run_id}/allure-report/index.html",
+            "log_html": f"/files/robot_runs/{run_id}/log.html",
+            "report_html": f"/files/robot_runs/{run_id}/report.html",
         })
     return out
 
@@ -161,14 +233,12 @@ class RobotPresetBody(BaseModel):
 
 
 @router.get("/presets")
-def list_presets() -> list[RobotPreset]:
-    with Session(engine) as session:
-        return session.query(RobotPreset).order_by(RobotPreset.id.desc()).all()
+def list_presets(session: Session = Depends(get_session)) -> list[RobotPreset]:
+    return session.exec(select(RobotPreset).order_by(RobotPreset.id.desc())).all()
 
 
-@router.post("/presets")
-def create_preset(body: RobotPresetBody) -> RobotPreset:
-    normalized_path = os.path.abspath(os.path.expanduser(body.suite_path.strip()))
+def _build_preset(body: RobotPresetBody) -> RobotPreset:
+    normalized_path = _normalize_path(body.suite_path)
     extras: list[str] = []
     if body.tags:
         for t in body.tags:
@@ -176,64 +246,69 @@ def create_preset(body: RobotPresetBody) -> RobotPreset:
                 extras.extend(["-i", t])
     if body.extra_args:
         extras.extend(body.extra_args)
-    preset = RobotPreset(
+    return RobotPreset(
         name=body.name,
         suite_path=normalized_path,
-        variables_json=(None if body.variables is None else __import__('json').dumps(body.variables)),
-        extra_args_json=(__import__('json').dumps(extras) if extras else None),
+        variables_json=(None if body.variables is None else orjson.dumps(body.variables).decode()),
+        extra_args_json=(orjson.dumps(extras).decode() if extras else None),
     )
-    with Session(engine) as session:
-        session.add(preset)
-        session.commit()
+
+
+@router.post("/presets")
+def create_preset(body: RobotPresetBody, session: Session = Depends(get_session)) -> RobotPreset:
+    preset = _build_preset(body)
+    session.add(preset)
+    session.commit()
+    session.refresh(preset)
+    return preset
+
+
+@router.post("/presets/bulk")
+def create_presets(bodies: List[RobotPresetBody], session: Session = Depends(get_session)) -> list[RobotPreset]:
+    presets = [_build_preset(body) for body in bodies]
+    save_all(session, presets)
+    for preset in presets:
         session.refresh(preset)
-        return preset
+    return presets
 
 
 @router.delete("/presets/{preset_id}")
-def delete_preset(preset_id: int) -> dict:
-    with Session(engine) as session:
-        preset = session.get(RobotPreset, preset_id)
-        if not preset:
-            raise HTTPException(status_code=404, detail="Preset not found")
-        session.delete(preset)
-        session.commit()
-        return {"deleted": True}
+def delete_preset(preset_id: int, session: Session = Depends(get_session)) -> dict:
+    preset = session.get(RobotPreset, preset_id)
+    if not preset:
+        raise HTTPException(status_code=404, detail="Preset not found")
+    session.delete(preset)
+    session.commit()
+    return {"deleted": True}
 
 
 @router.post("/run-preset/{preset_id}")
-async def run_preset(preset_id: int, background_tasks: BackgroundTasks) -> dict:
-    import json
-    with Session(engine) as session:
-        preset = session.get(RobotPreset, preset_id)
-        if not preset:
-            raise HTTPException(status_code=404, detail="Preset not found")
+async def run_preset(
+    preset_id: int,
+    session: Session = Depends(get_session),
+    status_store=Depends(get_run_status_store),
+    report_queue: asyncio.Queue = Depends(get_report_queue),
+) -> dict:
+    preset = await asyncio.to_thread(session.get, RobotPreset, preset_id)
+    if not preset:
+        raise HTTPException(status_code=404, detail="Preset not found")
     
-    variables = json.loads(preset.variables_json) if preset.variables_json else None
-    extra_args = json.loads(preset.extra_args_json) if preset.extra_args_json else None
+    variables = orjson.loads(preset.variables_json) if preset.variables_json else None
+    extra_args = orjson.loads(preset.extra_args_json) if preset.extra_args_json else None
     
-    # Create run record
-    with Session(engine) as session:
-        run = RobotRun(suite_path=preset.suite_path, output_dir="", return_code=None, ok=False)
-        session.add(run)
-        session.commit()
-        session.refresh(run)
+    # Create run record in the same session as the preset lookup
+    run = await asyncio.to_thread(_create_run, session, preset.suite_path)
 
     # Store initial running status
-    running_tasks[run.id] = {
+    await status_store.set(run.id, {
         "status": "running", 
         "start_time": datetime.now().isoformat(),
         "suite_path": preset.suite_path,
         "preset_name": preset.name
-    }
+    })
 
     # Run in background
-    background_tasks.add_task(
-        execute_robot_suite,
-        run.id,
-        preset.suite_path,
-        variables,
-        extra_args
-    )
+    _start_suite(status_store, report_queue, run.id, preset.suite_path, variables, extra_args)
 
     return {
         "run_id": run.id,
@@ -1,74 +1,88 @@
-from typing import List
-from fastapi import APIRouter, HTTPException
+import asyncio
+from typing import List, Optional
+
+import httpx
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
 from sqlmodel import Session, select
 
-from ..db import engine
+from ..db import get_session, load_and_release, save_all
 from ..models import WebsiteCheck, WebsiteRun
-from ..services.http_check import perform_http_request
+from ..services.http_check import gather_probes, get_http_client, get_probe_cache, perform_http_request
 
 router = APIRouter()
 
 
 @router.get("/checks", response_model=List[WebsiteCheck])
-def list_checks() -> List[WebsiteCheck]:
-    with Session(engine) as session:
-        return session.exec(select(WebsiteCheck).order_by(WebsiteCheck.id.desc())).all()
+def list_checks(session: Session = Depends(get_session)) -> List[WebsiteCheck]:
+    return session.exec(select(WebsiteCheck).order_by(WebsiteCheck.id.desc())).all()
 
 # ADD THIS ENDPOINT - This provides status information for the frontend
 @router.get("/checks-with-status")
-def list_checks_with_status() -> List[dict]:
-    with Session(engine) as session:
-        checks = session.exec(select(WebsiteCheck).order_by(WebsiteCheck.id.desc())).all()
-        result = []
-        
-        for check in checks:
-            # Get the latest run for each check
-            latest_run = session.exec(
-                select(WebsiteRun)
-                .where(WebsiteRun.website_id == check.id)
-                .order_by(WebsiteRun.id.desc())
-                .limit(1)
-            ).first()
-            
-            result.append({
-                "id": check.id,
-                "url": check.url,
-                "label": check.label,
-                "last_status": latest_run.ok if latest_run else None,
-                "last_checked": latest_run.created_at if latest_run else None,
-                "latency_ms": latest_run.latency_ms if latest_run else None,
-                "status_code": latest_run.status_code if latest_run else None
-            })
-        
-        return result
+def list_checks_with_status(session: Session = Depends(get_session)) -> List[dict]:
+    # Join each check to its newest run via a correlated MAX(id), which walks
+    # ix_websiterun_website_id_id once per check instead of scanning all runs
+    latest_run_id = (
+        select(func.max(WebsiteRun.id))
+        .where(WebsiteRun.website_id == WebsiteCheck.id)
+        .correlate(WebsiteCheck)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(
+            WebsiteCheck,
+            WebsiteRun.ok,
+            WebsiteRun.created_at,
+            WebsiteRun.latency_ms,
+            WebsiteRun.status_code,
+        )
+        .join(WebsiteRun, WebsiteRun.id == latest_run_id, isouter=True)
+        .order_by(WebsiteCheck.id.desc())
+    )
+    rows = session.exec(stmt).all()
+
+    return [
+        {
+            "id": check.id,
+            "url": check.url,
+            "label": check.label,
+            "last_status": ok,
+            "last_checked": created_at,
+            "latency_ms": latency_ms,
+            "status_code": status_code,
+        }
+        for check, ok, created_at, latency_ms, status_code in rows
+    ]
 
 @router.post("/checks", response_model=WebsiteCheck)
-def create_check(check: WebsiteCheck) -> WebsiteCheck:
-    with Session(engine) as session:
-        session.add(check)
-        session.commit()
-        session.refresh(check)
-        return check
+def create_check(check: WebsiteCheck, session: Session = Depends(get_session)) -> WebsiteCheck:
+    session.add(check)
+    session.commit()
+    session.refresh(check)
+    return check
 
 @router.delete("/checks/{check_id}")
-def delete_check(check_id: int) -> dict:
-    with Session(engine) as session:
-        check = session.get(WebsiteCheck, check_id)
-        if not check:
-            raise HTTPException(status_code=404, detail="Check not found")
-        session.delete(check)
-        session.commit()
-        return {"deleted": True}
+def delete_check(check_id: int, session: Session = Depends(get_session)) -> dict:
+    check = session.get(WebsiteCheck, check_id)
+    if not check:
+        raise HTTPException(status_code=404, detail="Check not found")
+    session.delete(check)
+    session.commit()
+    return {"deleted": True}
 
 @router.post("/run/{check_id}")
-async def run_single_check(check_id: int) -> dict:
-    with Session(engine) as session:
-        check = session.get(WebsiteCheck, check_id)
-        if not check:
-            raise HTTPException(status_code=404, detail="Check not found")
+async def run_single_check(
+    check_id: int,
+    client: httpx.AsyncClient = Depends(get_http_client),
+    session: Session = Depends(get_session),
+) -> dict:
+    check = await asyncio.to_thread(load_and_release, session, lambda s: s.get(WebsiteCheck, check_id))
+    if not check:
+        raise HTTPException(status_code=404, detail="Check not found")
     
     # Use shorter timeout for faster response
-    result = await perform_http_request("GET", check.url, timeout_s=8.0)
+    result = await perform_http_request(client, "GET", check.url, timeout_s=8.0)
     
     run = WebsiteRun(
         website_id=check_id,
@@ -78,31 +92,33 @@ async def run_single_check(check_id: int) -> dict:
         error=result.get("error"),
     )
     
-    with Session(engine) as session:
-        session.add(run)
-        session.commit()
+    await asyncio.to_thread(save_all, session, [run])
     
     return result
 
 @router.post("/run-all")
-async def run_all_checks() -> List[dict]:
-    with Session(engine) as session:
-        checks = session.exec(select(WebsiteCheck)).all()
+async def run_all_checks(
+    client: httpx.AsyncClient = Depends(get_http_client),
+    cache: Optional[TTLCache] = Depends(get_probe_cache),
+    session: Session = Depends(get_session),
+) -> List[dict]:
+    checks = await asyncio.to_thread(load_and_release, session, lambda s: s.exec(select(WebsiteCheck)).all())
     
-    results: List[dict] = []
-    for c in checks:
-        # Use shorter timeout for faster response
-        result = await perform_http_request("GET", c.url, timeout_s=8.0)
-        run = WebsiteRun(
+    # Use shorter timeout for faster response
+    probe_results = await gather_probes(
+        perform_http_request(client, "GET", c.url, timeout_s=8.0, cache=cache) for c in checks
+    )
+
+    runs = [
+        WebsiteRun(
             website_id=c.id,
             ok=bool(result.get("ok")),
             latency_ms=result.get("latency_ms"),
             status_code=result.get("status_code"),
             error=result.get("error"),
         )
-        with Session(engine) as session:
-            session.add(run)
-            session.commit()
-        results.append({"id": c.id, "label": c.label, "url": c.url, **result})
+        for c, result in zip(checks, probe_results)
+    ]
+    await asyncio.to_thread(save_all, session, runs)
     
-    return results
\ No newline at end of file
+    return [{"id": c.id, "label": c.label, "url": c.url, **result} for c, result in zip(checks, probe_results)]
\ No newline at end of file
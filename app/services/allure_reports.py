@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+from fastapi import Request
+from sqlalchemy import update
+
+from ..db import SessionLocal
+from ..models import RobotRun
+
+
+def create_report_queue() -> "asyncio.Queue[tuple[int, str]]":
+    """Queue of pending (run_id, output_dir) jobs, drained by run_report_worker."""
+    return asyncio.Queue()
+
+
+def get_report_queue(request: Request) -> "asyncio.Queue[tuple[int, str]]":
+    """Dependency returning the queue created in the lifespan handler."""
+    return request.app.state.report_queue
+
+
+async def generate_allure_report(output_dir: str) -> bool:
+    """Render allure-results into allure-report if the 'allure' CLI is available."""
+    results_dir = os.path.join(output_dir, "allure-results")
+    report_dir = os.path.join(output_dir, "allure-report")
+    if not os.path.isdir(results_dir):
+        return False
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "allure", "generate", results_dir, "-o", report_dir, "--clean"
+        )  # noqa: S603
+        return await proc.wait() == 0
+    except Exception:  # noqa: BLE001
+        return False
+
+
+def _mark_report_ready(run_id: int) -> None:
+    with SessionLocal() as session:
+        session.execute(update(RobotRun).where(RobotRun.id == run_id).values(report_ready=True))
+        session.commit()
+
+
+async def run_report_worker(report_queue: "asyncio.Queue[tuple[int, str]]", status_store) -> None:
+    """Generate reports one at a time, off the robot run's completion path."""
+    while True:
+        run_id, output_dir = await report_queue.get()
+        try:
+            if await generate_allure_report(output_dir):
+                await asyncio.to_thread(_mark_report_ready, run_id)
+                await status_store.update(run_id, report_ready=True)
+        except Exception:  # noqa: BLE001
+            pass
+        finally:
+            report_queue.task_done()
@@ -1,39 +1,151 @@
-import json
+import asyncio
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Awaitable, Dict, Iterable, List, Optional
 
 import httpx
+import orjson
+from cachetools import TTLCache
+from fastapi import Request
+
+from .. import settings
+
+
+# Characters of response body returned as a preview; at most 4 UTF-8 bytes each
+TEXT_PREVIEW_CHARS = 1000
+_TEXT_PREVIEW_BYTES = TEXT_PREVIEW_CHARS * 4
+# Bodies up to this size are read to the end (keeping only the preview) so the
+# connection goes back to the pool; larger ones are cut off and the connection closed
+_DRAIN_LIMIT_BYTES = 64 * 1024
+
+
+def create_client(timeout_s: float = 15.0) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=timeout_s,
+        follow_redirects=True,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_S,
+        ),
+    )
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Dependency returning the app-wide client created in the lifespan handler."""
+    return request.app.state.http
+
+
+def create_probe_cache() -> Optional[TTLCache]:
+    # Holds asyncio tasks, so it must live no longer than the event loop that runs them
+    if not settings.PROBE_CACHE_TTL_S:
+        return None
+    return TTLCache(maxsize=settings.PROBE_CACHE_SIZE, ttl=settings.PROBE_CACHE_TTL_S)
+
+
+def get_probe_cache(request: Request) -> Optional[TTLCache]:
+    """Dependency returning the probe cache created in the lifespan handler."""
+    return request.app.state.probe_cache
+
+
+def failed_result(error: str, latency_ms: Optional[float] = None) -> Dict[str, Any]:
+    return {
+        "ok": False,
+        "status_code": None,
+        "latency_ms": latency_ms,
+        "error": error,
+        "text": None,
+    }
+
+
+def _cache_key(
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, str]],
+    data: Optional[Any],
+    timeout_s: float,
+) -> tuple:
+    return (
+        method.upper(),
+        url,
+        orjson.dumps(headers, option=orjson.OPT_SORT_KEYS),
+        orjson.dumps(data, option=orjson.OPT_SORT_KEYS),
+        timeout_s,
+    )
 
 
 async def perform_http_request(
+    client: httpx.AsyncClient,
     method: str,
     url: str,
-    headers_json: Optional[str] = None,
-    body_json: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    data: Optional[Any] = None,
     timeout_s: float = 15.0,
+    cache: Optional[TTLCache] = None,
 ) -> Dict[str, Any]:
-    headers = json.loads(headers_json) if headers_json else None
-    data = json.loads(body_json) if body_json else None
+    """Probe `url`, reusing a recent identical probe from `cache` when one is given."""
+    if cache is None:
+        return await _probe(client, method, url, headers, data, timeout_s)
+    key = _cache_key(method, url, headers, data, timeout_s)
+    # Cache the task rather than its result so identical probes already in flight share it
+    task = cache.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_probe(client, method, url, headers, data, timeout_s))
+        cache[key] = task
+    return await asyncio.shield(task)
+
 
+async def _probe(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    headers: Optional[Dict[str, str]],
+    data: Optional[Any],
+    timeout_s: float,
+) -> Dict[str, Any]:
     t0 = time.perf_counter()
     try:
-        async with httpx.AsyncClient(timeout=timeout_s, follow_redirects=True) as client:
-            resp = await client.request(method.upper(), url, headers=headers, json=data)
+        # Stream the body and keep only the preview, so large pages are never
+        # downloaded or decoded in full
+        preview = bytearray()
+        received = 0
+        async with client.stream(method.upper(), url, headers=headers, json=data, timeout=timeout_s) as resp:
+            async for chunk in resp.aiter_bytes():
+                if len(preview) < _TEXT_PREVIEW_BYTES:
+                    preview += chunk[: _TEXT_PREVIEW_BYTES - len(preview)]
+                received += len(chunk)
+                if received >= _DRAIN_LIMIT_BYTES:
+                    break
         latency_ms = (time.perf_counter() - t0) * 1000.0
+        # resp.encoding falls back to UTF-8 when the declared charset is unknown
+        text = bytes(preview).decode(resp.encoding or "utf-8", errors="replace")
         return {
             "ok": resp.status_code < 500,
             "status_code": resp.status_code,
             "latency_ms": latency_ms,
             "error": None,
-            "text": resp.text[:1000],
+            "text": text[:TEXT_PREVIEW_CHARS],
         }
     except Exception as exc:  # noqa: BLE001
         latency_ms = (time.perf_counter() - t0) * 1000.0
-        return {
-            "ok": False,
-            "status_code": None,
-            "latency_ms": latency_ms,
-            "error": str(exc),
-            "text": None,
-        }
+        return failed_result(str(exc), latency_ms)
+
+
+async def gather_probes(
+    probes: Iterable[Awaitable[Dict[str, Any]]],
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Run probes concurrently (at most `limit` at a time), preserving order."""
+    sem = asyncio.Semaphore(limit or settings.PROBE_CONCURRENCY)
+
+    async def _bounded(probe: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        async with sem:
+            return await probe
 
+    outcomes = await asyncio.gather(*(_bounded(p) for p in probes), return_exceptions=True)
+    results: List[Dict[str, Any]] = []
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            results.append(failed_result(str(outcome)))
+        else:
+            results.append(outcome)
+    return results
@@ -1,9 +1,25 @@
+import asyncio
+import gzip
 import os
-import subprocess
+import shutil
 from typing import Dict, List, Optional
 
+from .. import settings
 
-def run_robot_suite(
+
+# Robot HTML outputs pre-compressed so nginx can serve them with gzip_static
+_GZIP_OUTPUTS = ("log.html", "report.html")
+
+
+def _gzip_outputs(output_dir: str) -> None:
+    for name in _GZIP_OUTPUTS:
+        path = os.path.join(output_dir, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+
+
+async def run_robot_suite(
     suite_path: str,
     output_dir: str,
     variables: Optional[Dict[str, str]] = None,
@@ -28,25 +44,22 @@ def run_robot_suite(
     env = os.environ.copy()
     # Tell allure-robotframework where to place results
     env["ALLURE_RESULTS_DIR"] = os.path.join(output_dir, "allure-results")
-    completed = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        cwd=work_dir,  # run from suite directory so relative resources work
-        env=env,
-    )  # noqa: S603, S607
-    with open(os.path.join(output_dir, "stdout.txt"), "w", encoding="utf-8") as f:
-        f.write(completed.stdout)
-    with open(os.path.join(output_dir, "stderr.txt"), "w", encoding="utf-8") as f:
-        f.write(completed.stderr)
-
-    # Try generating static Allure report if 'allure' CLI is available
-    try:
-        results_dir = os.path.join(output_dir, "allure-results")
-        report_dir = os.path.join(output_dir, "allure-report")
-        if os.path.isdir(results_dir):
-            subprocess.run(["allure", "generate", results_dir, "-o", report_dir, "--clean"], check=False)  # noqa: S603
-    except Exception:
-        pass
-    return completed.returncode
+    # Stream output straight to disk rather than buffering it in memory
+    with open(os.path.join(output_dir, "stdout.txt"), "wb") as so, open(
+        os.path.join(output_dir, "stderr.txt"), "wb"
+    ) as se:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=so,
+            stderr=se,
+            cwd=work_dir,  # run from suite directory so relative resources work
+            env=env,
+        )  # noqa: S603, S607
+        return_code = await proc.wait()
+
+    # Only nginx's gzip_static uses the .gz copies; the app's own mount ignores them
+    if not settings.SERVE_FILES:
+        await asyncio.to_thread(_gzip_outputs, output_dir)
+    # Allure report generation is queued separately, see services/allure_reports.py
+    return return_code
 
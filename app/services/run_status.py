@@ -0,0 +1,63 @@
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+
+
+class MemoryRunStatusStore:
+    """Per-process run status; only correct with a single uvicorn worker."""
+
+    def __init__(self) -> None:
+        self._runs: Dict[int, Dict[str, Any]] = {}
+
+    async def get(self, run_id: int) -> Optional[Dict[str, Any]]:
+        return self._runs.get(run_id)
+
+    async def set(self, run_id: int, status: Dict[str, Any]) -> None:
+        self._runs[run_id] = status
+
+    async def update(self, run_id: int, **fields: Any) -> None:
+        self._runs.setdefault(run_id, {}).update(fields)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisRunStatusStore:
+    """Run status shared across workers/hosts, expiring after `ttl_s` seconds."""
+
+    def __init__(self, url: str, ttl_s: int) -> None:
+        import redis.asyncio as redis  # optional dependency, only needed when REDIS_URL is set
+
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._ttl_s = ttl_s
+
+    @staticmethod
+    def _key(run_id: int) -> str:
+        return f"robot:run:{run_id}"
+
+    async def get(self, run_id: int) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(self._key(run_id))
+        return json.loads(raw) if raw else None
+
+    async def set(self, run_id: int, status: Dict[str, Any]) -> None:
+        await self._redis.set(self._key(run_id), json.dumps(status), ex=self._ttl_s)
+
+    async def update(self, run_id: int, **fields: Any) -> None:
+        status = await self.get(run_id) or {}
+        status.update(fields)
+        await self.set(run_id, status)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_run_status_store(redis_url: Optional[str], ttl_s: int):
+    if redis_url:
+        return RedisRunStatusStore(redis_url, ttl_s)
+    return MemoryRunStatusStore()
+
+
+def get_run_status_store(request: Request):
+    """Dependency returning the store created in the lifespan handler."""
+    return request.app.state.run_status
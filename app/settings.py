@@ -0,0 +1,23 @@
+import os
+from typing import Optional
+
+
+# When set (e.g. redis://localhost:6379/0), robot run status is shared across
+# workers via Redis; otherwise it is kept in-process.
+REDIS_URL: Optional[str] = os.getenv("REDIS_URL") or None
+
+# Seconds a run's status entry is kept in Redis before expiring
+RUN_STATUS_TTL_S = int(os.getenv("RUN_STATUS_TTL_S", "86400"))
+
+# Serve ./data under /files from the app. Disable when nginx serves it instead.
+SERVE_FILES = os.getenv("SERVE_FILES", "1") != "0"
+
+# Outbound probe tuning for the shared httpx client and the run-all endpoints
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "32"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "100"))
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "30"))
+
+# Identical run-all probes within this many seconds reuse the previous result (0 disables)
+PROBE_CACHE_TTL_S = float(os.getenv("PROBE_CACHE_TTL_S", "5"))
+PROBE_CACHE_SIZE = int(os.getenv("PROBE_CACHE_SIZE", "1024"))